@@ -1,6 +1,7 @@
 from setuptools import setup, find_packages
 import re
 import os
+import sys
 import numpy as np
 from glob import glob
 
@@ -17,12 +18,30 @@ OAT_DIR = os.path.dirname(__file__)
 
 ext = 'pyx' if USING_CYTHON else 'c'
 sources = glob('src/oxDNA_analysis_tools/cython_utils/*.{}'.format(ext))
+
+# MSVC doesn't understand the gcc/clang flags
+if sys.platform == 'win32':
+    compile_args = ['/O2']
+else:
+    compile_args = ['-O3', '-ffast-math', '-fno-math-errno']
+    # opt-in only: binaries built with -march=native SIGILL on older CPUs,
+    # so it must never leak into distributed wheels
+    if os.environ.get('OAT_MARCH_NATIVE'):
+        compile_args.append('-march=native')
+
 extensions = [
     Extension('oxDNA_analysis_tools.UTILS.'+source.split(os.path.sep)[-1].split('.')[0],
-              sources=[source]) for source in sources]
+              sources=[source],
+              extra_compile_args=compile_args) for source in sources]
 
 if USING_CYTHON:
-    extensions = cythonize(extensions, compiler_directives={'language_level' : "3"})
+    extensions = cythonize(extensions, compiler_directives={
+        'language_level' : "3",
+        'boundscheck' : False,
+        'wraparound' : False,
+        'cdivision' : True,
+        'initializedcheck' : False
+    })
 
 # Get version number
 def get_property(prop):
@@ -4,10 +4,11 @@ import pickle
 import re
 from os.path import exists, abspath
 from typing import List, Tuple, Iterator, Union
+from mmap import mmap, ACCESS_READ
 import os
 from .data_structures import *
 from .oat_multiprocesser import get_chunk_size
-from oxDNA_analysis_tools.UTILS.get_confs import cget_confs
+from oxDNA_analysis_tools.UTILS.get_confs import cget_confs, cget_confs_soa
 
 ####################################################################################
 ##########                             FILE READERS                       ##########
@@ -98,6 +99,19 @@ def _index(traj_file) -> List[ConfInfo]:
         raise out_e from e
     return idxs
 
+# One mmap per open trajectory (per process).  Repeated reads of the same file,
+# like view_traj scrubbing or chunked analyses, are then served straight from
+# the OS page cache instead of fresh read() calls.
+_mmap_cache = {}
+
+def _get_traj_mmap(traj_file:str) -> mmap:
+    mm = _mmap_cache.get(traj_file)
+    if mm is None or mm.closed or len(mm) != os.stat(traj_file).st_size:
+        with open(traj_file, 'rb') as f:
+            mm = mmap(f.fileno(), 0, access=ACCESS_READ)
+        _mmap_cache[traj_file] = mm
+    return mm
+
 def get_confs(top_info:TopInfo, traj_info:TrajInfo, start_conf:int, n_confs:int) -> List[Configuration]:
     """
         Read a chunk of configurations from a trajectory file.
@@ -116,7 +130,75 @@ def get_confs(top_info:TopInfo, traj_info:TrajInfo, start_conf:int, n_confs:int)
     traj_file = traj_info.path
     n_bases = top_info.nbases
     incl_v = traj_info.incl_v
-    return cget_confs(indexes, traj_file, start_conf, n_confs, n_bases, incl_vel=incl_v)
+
+    # this handles the last chunk, which may not have n_confs confs remaining
+    if start_conf + n_confs >= len(indexes):
+        n_confs = len(indexes) - start_conf
+
+    mm = _get_traj_mmap(traj_file)
+    chunk_start = indexes[start_conf].offset
+    chunk_end = indexes[start_conf+n_confs-1].offset + indexes[start_conf+n_confs-1].size
+
+    # The parser tokenizes in-place, so copy the slice out of the read-only map
+    chunk = bytearray(mm[chunk_start:chunk_end])
+    chunk.append(0) # NUL-terminate for the C tokenizer
+    conf_starts = [idx.offset - chunk_start for idx in indexes[start_conf:start_conf+n_confs]]
+    return cget_confs(chunk, conf_starts, n_bases, incl_vel=incl_v)
+
+# Pooled output buffers for get_confs_soa, keyed by (nconfs, nbases) so the
+# shorter final chunk of a trajectory gets its own set.  One pool per process.
+_soa_buffers = {}
+
+def get_confs_soa(top_info:TopInfo, traj_info:TrajInfo, start_conf:int, n_confs:int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+        Read a chunk of configurations from a trajectory file as structure-of-arrays buffers.
+
+        Unlike `get_confs`, this returns the whole chunk as contiguous stacked arrays,
+        which is the layout the batched/vectorized analyses want to consume.  The
+        parser fills pooled per-process buffers, so no Configuration objects (or any
+        new arrays at all, in steady state) are allocated.  Note that this means the
+        returned arrays are overwritten by the next call with the same chunk shape.
+
+        Parameters:
+            top_info (TopInfo) : Contains the number of bases in the configuration
+            traj_info (TrajInfo) : Contains metadata about the trajectory file
+            start_conf (int) : The index of the first conf to read
+            n_confs (int) : The number of confs to read
+
+        Returns:
+            Tuple[np.ndarray, ...] : (times (n,), boxes (n,3), energies (n,3), positions (n,nbases,3), a1s (n,nbases,3), a3s (n,nbases,3))
+    """
+    indexes = traj_info.idxs
+    traj_file = traj_info.path
+    n_bases = top_info.nbases
+    incl_v = traj_info.incl_v
+
+    # this handles the last chunk, which may not have n_confs confs remaining
+    if start_conf + n_confs >= len(indexes):
+        n_confs = len(indexes) - start_conf
+
+    mm = _get_traj_mmap(traj_file)
+    chunk_start = indexes[start_conf].offset
+    chunk_end = indexes[start_conf+n_confs-1].offset + indexes[start_conf+n_confs-1].size
+
+    # The parser tokenizes in-place, so copy the slice out of the read-only map
+    chunk = bytearray(mm[chunk_start:chunk_end])
+    chunk.append(0) # NUL-terminate for the C tokenizer
+    conf_starts = [idx.offset - chunk_start for idx in indexes[start_conf:start_conf+n_confs]]
+
+    bufs = _soa_buffers.get((n_confs, n_bases))
+    if bufs is None:
+        bufs = _soa_buffers[(n_confs, n_bases)] = (
+            np.empty(n_confs, dtype=np.int64),
+            np.empty((n_confs, 3)),
+            np.empty((n_confs, 3)),
+            np.empty((n_confs, n_bases, 3)),
+            np.empty((n_confs, n_bases, 3)),
+            np.empty((n_confs, n_bases, 3)),
+        )
+    times, boxes, energies, positions, a1s, a3s = bufs
+    cget_confs_soa(chunk, conf_starts, n_bases, times, boxes, energies, positions, a1s, a3s, incl_vel=incl_v)
+    return bufs
 
 ####################################################################################
 ##########                             FILE PARSERS                       ##########
@@ -474,6 +556,28 @@ def inbox(conf:Configuration, center:bool=True, centerpoint:Union[str,np.ndarray
         new_poses, conf.a1s, conf.a3s
     )
 
+def inbox_soa(positions:np.ndarray, boxes:np.ndarray, center:bool=True) -> np.ndarray:
+    """
+        Vectorized version of `inbox` for a whole chunk of confs stored as stacked arrays.
+
+        Parameters:
+            positions (np.ndarray) : (nconfs, nbases, 3) array of positions
+            boxes (np.ndarray) : (nconfs, 3) array of box sizes
+            center (bool) : If True, center each configuration in its box (default True)
+
+        Returns:
+            (np.ndarray) : The inboxed (nconfs, nbases, 3) positions array
+    """
+    boxes = boxes[:, np.newaxis, :]
+    if center:
+        # Calculate per-conf center of mass in home box of particles in many boxes
+        angle = (positions * 2 * np.pi) / boxes
+        cms = boxes[:, 0, :] / (2 * np.pi) * (np.arctan2(-np.mean(np.sin(angle), axis=1), -np.mean(np.cos(angle), axis=1)) + np.pi)
+        target = boxes[:, 0, :] / 2
+        positions = positions + (target - cms)[:, np.newaxis, :]
+    # Get coords in home box
+    return ((positions % boxes) + boxes) % boxes
+
 ####################################################################################
 ##########                             FILE WRITERS                       ##########
 ####################################################################################
@@ -1,20 +1,15 @@
 import oxpy
 from oxpy import InputFile
 from os.path import join, abspath, dirname, exists, basename
-from os import mkdir, getpid,chdir, getcwd
+from os import mkdir, getpid,chdir, getcwd, stat
 from multiprocessing import Process
 from shutil import copyfile, rmtree
-from oxDNA_analysis_tools.UTILS.oxview import from_path, oxdna_conf
 from json import dumps
-import matplotlib.pyplot as plt
-import pandas as pd
 from copy import deepcopy
 import sys
 from oxDNA_analysis_tools.UTILS.RyeReader import describe, get_confs
-import ipywidgets as widgets
-from IPython.display import display, IFrame
 import numpy as np
-from functools import wraps
+from functools import lru_cache, wraps
 import subprocess
 
 default_input_file = {
@@ -126,16 +121,32 @@ def setup_simulation(top_path:str, dat_path:str, out_dir:str, parameters:dict[st
         file.write(str(input_file))
     return input_file_path
 
-# our typical run function for a provided dictionary input file 
-def _prun(input_file_path:str):
+# our typical run function for an already-parsed input file
+def _prun(options:dict, out_dir:str):
     with oxpy.Context():
-        # change to the directory of the input file path
-        chdir(dirname(abspath(input_file_path)))
+        # change to the simulation directory
+        chdir(out_dir)
+        # rebuild the options from the parent's already-parsed InputFile with a
+        # cheap setter loop instead of re-opening and re-parsing the file
         input_file = InputFile()
-        input_file.init_from_filename(basename(input_file_path))
+        for k, v in options.items():
+            input_file[k] = v
         manager = oxpy.OxpyManager(input_file)
-        manager.run_complete() #run complete run's it till the number steps specified are reached 
-            
+        manager.run_complete() #run complete run's it till the number steps specified are reached
+
+
+@lru_cache(maxsize=32)
+def _describe_cached(top_path:str, traj_path:str, stat_key):
+    return describe(top_path, traj_path)
+
+def _describe(top_path:str, traj_path:str):
+    """
+        describe() rescans the whole trajectory to build the conf index, which is
+        wasteful when the viewer methods hit the same file over and over.  Key the
+        cache on (mtime, size) so entries for files that have grown are ignored.
+    """
+    s = stat(traj_path)
+    return _describe_cached(top_path, traj_path, (s.st_mtime_ns, s.st_size))
 
 def path_decorator(func):
     @wraps(func)
@@ -170,8 +181,8 @@ class Simulation:
         """
             returns the initial configuration of the simulation as a rye reader object
         """
-        ti, di = describe(abspath(self.input_file["topology"]),
-                          abspath(self.input_file["conf_file"]))
+        ti, di = _describe(abspath(self.input_file["topology"]),
+                           abspath(self.input_file["conf_file"]))
         return (ti, di), get_confs(ti, di, 0, 1)[0]
     
     @path_decorator
@@ -179,8 +190,8 @@ class Simulation:
         """
             returns the last configuration of the simulation as a rye reader object
         """
-        ti, di = describe(abspath(self.input_file["topology"]),
-                          abspath(self.input_file["lastconf_file"]))
+        ti, di = _describe(abspath(self.input_file["topology"]),
+                           abspath(self.input_file["lastconf_file"]))
         return (ti,di), get_confs(ti, di, 0,1)[0]
         
     
@@ -188,6 +199,8 @@ class Simulation:
         """
             opens the initial configuration in an embeded oxDNA viewer window
         """
+        from oxDNA_analysis_tools.UTILS.oxview import oxdna_conf
+
         (ti,di), conf = self.get_init_conf()        
         oxdna_conf(ti, conf)
                           
@@ -195,6 +208,8 @@ class Simulation:
         """
             opens the last configuration in an embeded oxDNA viewer window
         """
+        from oxDNA_analysis_tools.UTILS.oxview import oxdna_conf
+
         (ti,di), conf = self.get_last_conf()
         oxdna_conf(ti, conf)
     
@@ -203,8 +218,8 @@ class Simulation:
         """
             returns the number of configurations in the trajectory
         """
-        ti,di = describe(abspath(self.input_file["topology"]),
-                         abspath(self.input_file["trajectory_file"]))
+        ti,di = _describe(abspath(self.input_file["topology"]),
+                          abspath(self.input_file["trajectory_file"]))
         return len(di.idxs)
     
     @path_decorator
@@ -213,8 +228,8 @@ class Simulation:
             returns the configuration at the given index in the trajectory
             as a rye reader object
         """
-        ti,di = describe(abspath(self.input_file["topology"]),
-                         abspath(self.input_file["trajectory_file"]))
+        ti,di = _describe(abspath(self.input_file["topology"]),
+                          abspath(self.input_file["trajectory_file"]))
         l = len(di.idxs)
         if(id < l):
             return (ti,di), get_confs(ti,di, id, 1)[0]
@@ -225,6 +240,8 @@ class Simulation:
         """ 
             opens the configuration at the given index in the trajectory as an embeded oxDNA viewer window
         """
+        from oxDNA_analysis_tools.UTILS.oxview import oxdna_conf
+
         (ti,di), conf = self.get_conf(id)
         oxdna_conf(ti, conf)
     
@@ -236,6 +253,11 @@ class Simulation:
             init: the initial configuration to start the trajectory from
             op: an optional observable to plot along side the trajectory
         """
+        import ipywidgets as widgets
+        import matplotlib.pyplot as plt
+        from IPython.display import display
+        from oxDNA_analysis_tools.UTILS.oxview import oxdna_conf
+
         # get the initial conf and the reference to the trajectory 
         (ti,di), cur_conf = self.get_conf(init)
         
@@ -288,8 +310,9 @@ class Simulation:
         if(self.p):
             self.terminate()
         
-        #spawn the process
-        self.p = Process(target=_prun, args = (self.__input_file_path,))
+        #spawn the process, handing over the already-parsed options as a real
+        #dict; going through str() would mangle multi-line {...} block values
+        self.p = Process(target=_prun, args = ({k: self.input_file[k] for k in self.input_file.keys()}, self.out_dir))
         
         self.p.start()
         return self
@@ -315,14 +338,18 @@ class Simulation:
         """
             plots the energy graph of the running simulation
         """
-        df = pd.read_csv(self.input_file["energy_file"], delimiter="\s+",names=['time', 'U','P','K'])
+        import matplotlib.pyplot as plt
+
+        # np.loadtxt is much faster than a regex-delimited pd.read_csv for a
+        # small whitespace-separated numeric file, and we only need the arrays
+        time, U, P, K = np.loadtxt(self.input_file["energy_file"], unpack=True)
         dt = float(self.input_file["dt"])
         steps = float(self.input_file["steps"])
 
         # make sure our figure is bigger
-        plt.figure(figsize=(15,3)) 
+        plt.figure(figsize=(15,3))
         # plot the energy
-        plt.plot(df.time/dt,df.U)
+        plt.plot(time/dt,U)
 
         plt.ylabel("Energy")
         plt.xlabel("Steps")
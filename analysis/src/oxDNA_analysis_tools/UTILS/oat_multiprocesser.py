@@ -1,11 +1,37 @@
 from oxDNA_analysis_tools.UTILS.logger import log, logger_settings
 from multiprocessing import Pool
 from typing import Callable, NamedTuple
+import os
 
 def get_chunk_size():
     from oxDNA_analysis_tools.UTILS.chunksize import CHUNKSIZE
     return CHUNKSIZE
 
+def _limit_worker_threads():
+    """
+        Worker initializer which pins each worker's BLAS pool to one thread.
+
+        With ncpus workers each running an unbounded LAPACK threadpool the batched
+        linalg calls oversubscribe the machine and context-switch instead of
+        computing; the parallelism comes from the process pool itself.
+    """
+    # the env vars cover libraries that are loaded after the fork
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS", "VECLIB_MAXIMUM_THREADS"):
+        os.environ[var] = "1"
+    # threadpoolctl (optional) also reins in pools that already exist
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=1)
+    except ImportError:
+        pass
+    # numba's prange kernels would otherwise spin up a full-width thread pool
+    # in every worker on top of the process-level parallelism
+    try:
+        import numba
+        numba.set_num_threads(1)
+    except ImportError:
+        pass
+
 # set_chunk_size is in config.py
 
 def oat_multiprocesser(nconfs:int, ncpus:int, function:Callable, callback:Callable, ctx:NamedTuple):
@@ -23,7 +49,8 @@ def oat_multiprocesser(nconfs:int, ncpus:int, function:Callable, callback:Callab
     """
     chunk_size = get_chunk_size()
 
-    pool = Pool(ncpus)
+    # with a single worker the BLAS pool is the only parallelism we have, so leave it alone
+    pool = Pool(ncpus, initializer=_limit_worker_threads if ncpus > 1 else None)
 
     # Figure out how many jobs we need to run
     nchunks = int(nconfs / chunk_size + (1 if nconfs % chunk_size else 0))
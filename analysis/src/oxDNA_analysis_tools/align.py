@@ -1,19 +1,39 @@
 import argparse
 import os
 import time
+from queue import Queue
+from threading import Thread
+from multiprocessing.shared_memory import SharedMemory
 from typing import List, Tuple, Union
 import numpy as np
 from collections import namedtuple
 from oxDNA_analysis_tools.UTILS.data_structures import Configuration
-from oxDNA_analysis_tools.UTILS.oat_multiprocesser import oat_multiprocesser
-from oxDNA_analysis_tools.UTILS.RyeReader import get_confs, describe, inbox, conf_to_str
+from oxDNA_analysis_tools.UTILS.oat_multiprocesser import oat_multiprocesser, get_chunk_size
+from oxDNA_analysis_tools.UTILS.RyeReader import get_confs, get_confs_soa, describe, inbox, inbox_soa
 from oxDNA_analysis_tools.UTILS.logger import log, logger_settings
+from oxDNA_analysis_tools.UTILS.serialize import cserialize_chunk
+
+# numba is an optional dependency.  If it's available, alignment uses a jitted
+# kernel which parallelizes over the confs in a chunk, otherwise we fall back
+# to the batched NumPy implementation.
+try:
+    from numba import njit, prange
+    import numba
+    # the TBB and OpenMP threading layers can deadlock at process exit when the
+    # process has also forked (our multiprocessing pool); workqueue is fork-safe
+    numba.config.THREADING_LAYER = 'workqueue'
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
 
 ComputeContext = namedtuple("ComputeContext",["traj_info",
                                               "top_info",
-                                              "centered_ref_coords",
+                                              "ref_shm_name",
+                                              "ref_shape",
+                                              "ref_dtype",
                                               "indexes",
-                                              "center"])
+                                              "center",
+                                              "skip_inbox"])
 
 def svd_align(ref_coords:np.ndarray, coords:np.ndarray, indexes:np.ndarray, ref_center:np.ndarray=np.array([])) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
@@ -34,12 +54,14 @@ def svd_align(ref_coords:np.ndarray, coords:np.ndarray, indexes:np.ndarray, ref_
     av1 = ref_center
     ref_coords = ref_coords - av1
 
-    # Center the victim 
-    av2 = np.mean(coords[0][indexes], axis=0)
+    # Center the victim (index once and reuse the selection for the correlation)
+    sel = coords[0][indexes]
+    av2 = np.mean(sel, axis=0)
     coords[0] = coords[0] - av2
+    sel = sel - av2
 
     # Correlation matrix
-    a = np.dot(np.transpose(coords[0][indexes]), ref_coords)
+    a = np.dot(np.transpose(sel), ref_coords)
     u, _, vt = np.linalg.svd(a)
     rot = np.transpose(np.dot(np.transpose(vt), np.transpose(u)))
 
@@ -54,23 +76,175 @@ def svd_align(ref_coords:np.ndarray, coords:np.ndarray, indexes:np.ndarray, ref_
              np.dot(coords[1], rot),
              np.dot(coords[2], rot))
 
+# Per-process scratch buffers for the batched chunk math, keyed by (name, shape)
+# so the last (shorter) chunk of a trajectory gets its own set.  Reusing them
+# avoids re-allocating ~chunk-sized arrays for every chunk a worker processes.
+_scratch_buffers = {}
+
+def _get_scratch(name:str, shape:Tuple[int, ...]) -> np.ndarray:
+    buf = _scratch_buffers.get((name, shape))
+    if buf is None:
+        buf = _scratch_buffers[(name, shape)] = np.empty(shape)
+    return buf
+
+def svd_align_chunk(ref_coords:np.ndarray, positions:np.ndarray, a1s:np.ndarray, a3s:np.ndarray, indexes:np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Align a whole chunk of configurations to a centered reference in one batched call.
+
+    The optimal rotations are found with Horn's quaternion method: the largest
+    eigenvector of a 4x4 matrix built from each conf's correlation matrix.  This is
+    cheaper than a full SVD on each 3x3 and always yields a proper rotation, so no
+    reflection check is needed.
+
+    Note that the returned arrays are per-process scratch buffers which will be
+    overwritten by the next call with the same chunk shape.
+
+    Parameters:
+        ref_coords (numpy.ndarray): Reference coordinates.  Should be indexed and centered before calling this function.
+        positions (numpy.ndarray): (nconfs, nbases, 3) array of positions for the chunk
+        a1s (numpy.ndarray): (nconfs, nbases, 3) array of a1 orientation vectors for the chunk
+        a3s (numpy.ndarray): (nconfs, nbases, 3) array of a3 orientation vectors for the chunk
+        indexes (np.ndarray[int]): Indexes of the particles to be aligned in the positions array
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: The aligned (positions, a1s, a3s) arrays for the chunk
+    """
+    # Center each conf on the cms of its indexed particles
+    centers = np.mean(positions[:, indexes], axis=1, keepdims=True)
+    positions = positions - centers
+
+    # Correlation matrices for every conf in one shot ((nconfs, 3, 3))
+    corr = _get_scratch('corr', (positions.shape[0], 3, 3))
+    np.einsum('nji,jk->nik', positions[:, indexes], ref_coords, out=corr)
+
+    # Horn's 4x4 symmetric matrix for every conf
+    nconfs = corr.shape[0]
+    K = _get_scratch('K', (nconfs, 4, 4))
+    K[:,0,0] = corr[:,0,0] + corr[:,1,1] + corr[:,2,2]
+    K[:,0,1] = K[:,1,0] = corr[:,1,2] - corr[:,2,1]
+    K[:,0,2] = K[:,2,0] = corr[:,2,0] - corr[:,0,2]
+    K[:,0,3] = K[:,3,0] = corr[:,0,1] - corr[:,1,0]
+    K[:,1,1] = corr[:,0,0] - corr[:,1,1] - corr[:,2,2]
+    K[:,1,2] = K[:,2,1] = corr[:,0,1] + corr[:,1,0]
+    K[:,1,3] = K[:,3,1] = corr[:,2,0] + corr[:,0,2]
+    K[:,2,2] = corr[:,1,1] - corr[:,0,0] - corr[:,2,2]
+    K[:,2,3] = K[:,3,2] = corr[:,1,2] + corr[:,2,1]
+    K[:,3,3] = corr[:,2,2] - corr[:,0,0] - corr[:,1,1]
+
+    # The optimal rotation is the eigenvector with the largest eigenvalue (batched eigh)
+    _, v = np.linalg.eigh(K)
+    q0, q1, q2, q3 = v[:,0,-1], v[:,1,-1], v[:,2,-1], v[:,3,-1]
+
+    # Quaternion -> rotation matrix, filled transposed since we right-multiply row vectors
+    rots = _get_scratch('rots', (nconfs, 3, 3))
+    rots[:,0,0] = q0*q0 + q1*q1 - q2*q2 - q3*q3
+    rots[:,1,0] = 2*(q1*q2 - q0*q3)
+    rots[:,2,0] = 2*(q1*q3 + q0*q2)
+    rots[:,0,1] = 2*(q1*q2 + q0*q3)
+    rots[:,1,1] = q0*q0 - q1*q1 + q2*q2 - q3*q3
+    rots[:,2,1] = 2*(q2*q3 - q0*q1)
+    rots[:,0,2] = 2*(q1*q3 - q0*q2)
+    rots[:,1,2] = 2*(q2*q3 + q0*q1)
+    rots[:,2,2] = q0*q0 - q1*q1 - q2*q2 + q3*q3
+
+    # Apply transformations (batched matmul into reused output buffers)
+    out_pos = _get_scratch('out_pos', positions.shape)
+    out_a1s = _get_scratch('out_a1s', a1s.shape)
+    out_a3s = _get_scratch('out_a3s', a3s.shape)
+    np.matmul(positions, rots, out=out_pos)
+    np.matmul(a1s, rots, out=out_a1s)
+    np.matmul(a3s, rots, out=out_a3s)
+    return (out_pos, out_a1s, out_a3s)
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, parallel=True, fastmath=True)
+    def _align_kernel(positions:np.ndarray, a1s:np.ndarray, a3s:np.ndarray, ref_coords:np.ndarray, indexes:np.ndarray):
+        """
+        Jitted equivalent of svd_align_chunk which modifies the chunk arrays in-place.
+
+        Each conf is handled by a separate thread via prange.  The particle array is
+        memory-bound at these sizes, so the mean and the correlation matrix are
+        accumulated in a single read of the selection (the ref is centered, so the
+        correlation needs no mean correction) and the centering is folded into the
+        rotation pass instead of being a pass of its own.
+        """
+        nsel = indexes.shape[0]
+        for n in prange(positions.shape[0]):
+            pos = positions[n]
+            # one pass: accumulate the selection's sum and raw correlation together
+            cx = cy = cz = 0.
+            corr = np.zeros((3, 3))
+            for s in range(nsel):
+                i = indexes[s]
+                x, y, z = pos[i, 0], pos[i, 1], pos[i, 2]
+                cx += x
+                cy += y
+                cz += z
+                for k in range(3):
+                    r = ref_coords[s, k]
+                    corr[0, k] += x * r
+                    corr[1, k] += y * r
+                    corr[2, k] += z * r
+            cx /= nsel
+            cy /= nsel
+            cz /= nsel
+            u, _, vt = np.linalg.svd(corr)
+            rot = u @ vt
+            if np.linalg.det(rot) < 0:
+                vt[2] = -vt[2]
+                rot = u @ vt
+            # second pass: subtract the center and rotate in the same sweep
+            for i in range(pos.shape[0]):
+                x, y, z = pos[i, 0] - cx, pos[i, 1] - cy, pos[i, 2] - cz
+                for k in range(3):
+                    pos[i, k] = x * rot[0, k] + y * rot[1, k] + z * rot[2, k]
+                x, y, z = a1s[n, i, 0], a1s[n, i, 1], a1s[n, i, 2]
+                for k in range(3):
+                    a1s[n, i, k] = x * rot[0, k] + y * rot[1, k] + z * rot[2, k]
+                x, y, z = a3s[n, i, 0], a3s[n, i, 1], a3s[n, i, 2]
+                for k in range(3):
+                    a3s[n, i, k] = x * rot[0, k] + y * rot[1, k] + z * rot[2, k]
+
 def compute(ctx:ComputeContext, chunk_size, chunk_id:int):
-    confs = get_confs(ctx.top_info, ctx.traj_info, chunk_id*chunk_size, chunk_size)
-    confs = [inbox(c, center=ctx.center) for c in confs]
-    # convert to numpy repr
-    np_coords = np.asarray([[c.positions, c.a1s, c.a3s] for c in confs])
-
-    # align
-    for i, c in enumerate(np_coords):
-        c[0], c[1], c[2] = svd_align(ctx.centered_ref_coords, c, ctx.indexes, ref_center=np.zeros(3))
-        confs[i].positions = c[0]
-        confs[i].a1s = c[1]
-        confs[i].a3s = c[2]
-    #return confs
-    out = ''.join([conf_to_str(c, include_vel=ctx.traj_info.incl_v) for c in confs])
-    return out
-
-def align(traj:str, outfile:str, ncpus:int=1, indexes:List[int]=[], ref_conf:Union[Configuration,None]=None, center:bool=True):
+    # read the chunk as SoA buffers, no per-conf objects to restack
+    times, boxes, energies, positions, a1s, a3s = get_confs_soa(ctx.top_info, ctx.traj_info, chunk_id*chunk_size, chunk_size)
+    if not ctx.skip_inbox:
+        positions = inbox_soa(positions, boxes, center=ctx.center)
+
+    # attach to the reference coordinates instead of unpickling a copy per chunk
+    ref_shm = SharedMemory(name=ctx.ref_shm_name)
+    centered_ref_coords = np.ndarray(ctx.ref_shape, dtype=ctx.ref_dtype, buffer=ref_shm.buf)
+
+    # align the whole chunk, either with the jitted kernel or a single batched SVD call
+    if NUMBA_AVAILABLE:
+        # the jitted kernel can't take a slice, so expand the all-particle case
+        if isinstance(ctx.indexes, slice):
+            kernel_indexes = np.arange(positions.shape[1], dtype=np.int64)
+        else:
+            kernel_indexes = ctx.indexes.astype(np.int64)
+        _align_kernel(positions, a1s, a3s, np.ascontiguousarray(centered_ref_coords), kernel_indexes)
+    else:
+        positions, a1s, a3s = svd_align_chunk(centered_ref_coords, positions, a1s, a3s, ctx.indexes)
+
+    # views into the shared block must be dropped before it can be closed
+    del centered_ref_coords
+    ref_shm.close()
+
+    # serialize each conf's particle block with one vectorized np.savetxt call
+    # instead of formatting value-by-value in Python
+    nconfs, nbases = positions.shape[0], positions.shape[1]
+    ncols = 15 if ctx.traj_info.incl_v else 9
+    combined = np.zeros((nconfs, nbases, ncols))
+    combined[:, :, 0:3] = positions
+    combined[:, :, 3:6] = a1s
+    combined[:, :, 6:9] = a3s # the velocity columns, when present, stay zero
+
+    # one C call per chunk: snprintf into a single preallocated buffer releases
+    # the GIL and replaces the per-frame Python formatting (and the thread pool
+    # that existed to hide its cost)
+    return cserialize_chunk(times, np.ascontiguousarray(boxes), np.ascontiguousarray(energies), combined)
+
+def align(traj:str, outfile:str, ncpus:int=1, indexes:List[int]=[], ref_conf:Union[Configuration,None]=None, center:bool=True, skip_inbox:bool=False):
     """
         Align a trajectory to a ref_conf and print the result to a file.
 
@@ -80,6 +254,7 @@ def align(traj:str, outfile:str, ncpus:int=1, indexes:List[int]=[], ref_conf:Uni
             ncpus (int) : (optional) How many cpus to parallelize the operation. default=1
             indexes (List[int]) : (optional) IDs of a subset of particles to consider for the alignment. default=all
             ref_conf (Configuration) : (optional) The configuration to align to. default=first conf
+            skip_inbox (bool) : (optional) Skip the inboxing pass entirely for already-inboxed trajectories. default=False
 
         Writes the aligned configuration to outfile
     """
@@ -90,8 +265,12 @@ def align(traj:str, outfile:str, ncpus:int=1, indexes:List[int]=[], ref_conf:Uni
         #read the first configuration and use it as the reference configuration for the rest
         ref_conf = get_confs(top_info, traj_info, 0, 1)[0]
 
-    if indexes == []:
-        indexes = list(range(top_info.nbases))
+    if len(indexes) == 0:
+        # aligning to everything: a slice is a zero-copy view, unlike fancy indexing
+        indexes = slice(None)
+    else:
+        # fancy indexing with a Python list re-builds the index array on every use
+        indexes = np.asarray(indexes, dtype=np.intp)
 
     ref_conf = inbox(ref_conf) # Don't need to center now because we're going to after indexing anyway.
 
@@ -100,17 +279,70 @@ def align(traj:str, outfile:str, ncpus:int=1, indexes:List[int]=[], ref_conf:Uni
     ref_cms = np.mean(reference_coords, axis=0) # cms prior to centering
     reference_coords = reference_coords - ref_cms
 
-    # Create a ComputeContext which defines the problem to pass to the worker processes 
+    # Stage the reference in shared memory so workers attach to one copy
+    # instead of each unpickling their own
+    ref_shm = SharedMemory(create=True, size=reference_coords.nbytes)
+    shared_ref = np.ndarray(reference_coords.shape, dtype=reference_coords.dtype, buffer=ref_shm.buf)
+    shared_ref[:] = reference_coords
+
+    # Create a ComputeContext which defines the problem to pass to the worker processes
     ctx = ComputeContext(
-        traj_info, top_info, reference_coords, indexes, center
+        traj_info, top_info, ref_shm.name, reference_coords.shape, reference_coords.dtype, indexes, center, skip_inbox
     )
 
-    with open(outfile, 'w+') as f:
-        def callback(i, r):
-            nonlocal f
-            f.write(r)
+    try:
+        if ncpus == 1:
+            # a single-cpu job gains nothing from the process pool; skip the
+            # fork/pickle overhead and run the batched kernel in-process
+            # (LAPACK parallelizes the batched calls on its own)
+            chunk_size = get_chunk_size()
+            nchunks = int(traj_info.nconfs / chunk_size + (1 if traj_info.nconfs % chunk_size else 0))
+            with open(outfile, 'wb', buffering=4194304) as f:
+                for i in range(nchunks):
+                    f.write(compute(ctx, chunk_size, i))
+                    print(f"finished {i+1}/{nchunks}", end="\r")
+                print()
+        else:
+            # binary mode with a large buffer: one syscall per few MiB instead of one per chunk,
+            # and no text-codec pass on each write
+            with open(outfile, 'wb', buffering=4194304) as f:
+                # drain chunks on a dedicated writer thread so a disk stall doesn't
+                # block collection of the next worker result
+                write_queue = Queue(maxsize=8)
+                write_err = []
+                def writer():
+                    while True:
+                        r = write_queue.get()
+                        if r is None:
+                            break
+                        # after a failed write keep draining so the producer's
+                        # put() never blocks on the bounded queue
+                        if write_err:
+                            continue
+                        try:
+                            f.write(r)
+                        except Exception as e:
+                            write_err.append(e)
+
+                writer_thread = Thread(target=writer)
+                writer_thread.start()
+
+                def callback(i, r):
+                    write_queue.put(r)
 
-        oat_multiprocesser(traj_info.nconfs, ncpus, compute, callback, ctx)
+                # chunks arrive from the multiprocesser already in order, so the writer
+                # can write them as they come off the queue
+                try:
+                    oat_multiprocesser(traj_info.nconfs, ncpus, compute, callback, ctx)
+                finally:
+                    write_queue.put(None)
+                    writer_thread.join()
+                if write_err:
+                    raise write_err[0]
+    finally:
+        del shared_ref
+        ref_shm.close()
+        ref_shm.unlink()
     
     log(f"Wrote aligned trajectory to {outfile}")
     return
@@ -3,11 +3,15 @@ import argparse
 from os import remove, path
 from oxDNA_analysis_tools.UTILS.logger import log, logger_settings
 from typing import List
-import matplotlib.pyplot as plt
-from matplotlib.colors import ListedColormap
-from sklearn.cluster import DBSCAN
-from matplotlib import animation
 from json import dump, load
+
+# orjson is an optional dependency.  If it's available, serializing the input
+# data skips the Python list-of-lists intermediate entirely.
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 from oxDNA_analysis_tools.config import check
 from oxDNA_analysis_tools.UTILS.data_structures import TrajInfo, TopInfo
 from oxDNA_analysis_tools.UTILS.RyeReader import get_confs, linear_read, conf_to_str, describe, write_conf
@@ -22,7 +26,7 @@ def split_trajectory(traj_info, top_info, labs) -> None:
         labs (numpy.array): The cluster each configuration belongs to.
     """
 
-    slabs = set(labs)
+    slabs = np.unique(labs)
 
     for cluster in slabs:
         #Clear old trajectory files
@@ -33,33 +37,29 @@ def split_trajectory(traj_info, top_info, labs) -> None:
     log("splitting trajectory...")
 
     fnames = ["cluster_"+str(cluster)+".dat" for cluster in slabs]
-    files = [open(f, 'w+') for f in fnames]
+    # binary mode with a large buffer batches the many small per-conf writes
+    # into a few syscalls per file
+    files = {cluster : open(f, 'wb', buffering=4194304) for cluster, f in zip(slabs, fnames)}
     i = 0
 
     for chunk in linear_read(traj_info, top_info):
+        # group the chunk by cluster and hand each file one writelines call
+        # instead of a write per conf
+        per_cluster = {cluster : [] for cluster in slabs}
         for conf in chunk:
-            files[labs[i]].write(conf_to_str(conf, include_vel=traj_info.incl_v))
+            per_cluster[labs[i]].append(conf_to_str(conf, include_vel=traj_info.incl_v).encode('ascii'))
             i += 1
+        for cluster, bufs in per_cluster.items():
+            if bufs:
+                files[cluster].writelines(bufs)
 
-    for f in files:
+    for f in files.values():
         f.close()
 
     log(f"Wrote trajectory files: {fnames}")
 
     return
 
-def find_element(n, x, array):
-    """
-    Finds the id of the nth time element x appears in an array.
-    """
-    c = 0
-    for i, j in enumerate(array):
-        if (j == x):
-            if (c == n):
-                return i
-            c += 1
-    return -1
-
 def get_centroid(points:np.ndarray, metric_name:str, labs:np.ndarray, traj_info:TrajInfo, top_info:TopInfo) -> List[int]:
     """
     Takes the output from DBSCAN and finds the centroid of each cluster.
@@ -75,18 +75,23 @@ def get_centroid(points:np.ndarray, metric_name:str, labs:np.ndarray, traj_info:
         List[int]: The configuration ID for the centroid of each cluster
     """
 
+    from sklearn.metrics.pairwise import euclidean_distances
+
     log("Finding cluster centroids...")
-    if metric_name == 'euclidean':
-        points = points[np.newaxis,:,:] - points[:,np.newaxis,:]
-        points = np.sum(points**2, axis=2) #squared distance is still correct distance 
 
     cids = []
-    for cluster in (set(labs)):
+    for cluster in np.unique(labs):
         to_extract = labs == cluster
-        masked = points[np.ix_(to_extract, to_extract)]
+        # Compute distances one cluster at a time instead of materializing the
+        # full nconfs x nconfs matrix (squared distance is still correct distance)
+        if metric_name == 'euclidean':
+            masked = euclidean_distances(points[to_extract], squared=True)
+        else:
+            masked = points[to_extract][:, to_extract]
         in_cluster_id = np.sum(masked, axis = 1).argmin()
 
-        centroid_id = find_element(in_cluster_id, cluster, labs)
+        # map the position within the cluster back to a conf id
+        centroid_id = int(np.flatnonzero(to_extract)[in_cluster_id])
         cids.append(centroid_id)
 
         centroid = get_confs(top_info, traj_info, centroid_id, 1)[0]
@@ -97,12 +102,12 @@ def get_centroid(points:np.ndarray, metric_name:str, labs:np.ndarray, traj_info:
     return cids
 
 def make_plot(op, labels, centroid_ids, interactive_plot, op_names):
+    # matplotlib is slow to import, so only pay for it when actually plotting
+    import matplotlib.pyplot as plt
+    from matplotlib import animation
+    from matplotlib.colors import ListedColormap
+
     # Prepping a plot of the first 3 dimensions of the provided op
-    dimensions = []
-    x = []
-    y = []
-    dimensions.append(x)
-    dimensions.append(y)
     if len(op_names)==0:
         op_names = ['OP0', 'OP1', 'OP2']
 
@@ -112,15 +117,12 @@ def make_plot(op, labels, centroid_ids, interactive_plot, op_names):
         add_time = True
         op = np.hstack((op, np.arange(op.shape[0]).reshape(op.shape[0], 1)))
 
-    if op.shape[1] > 2:
-        z = []
-        dimensions.append(z)
-    
-    for i in op:
-        for j, dim in enumerate(dimensions):
-            dim.append(i[j])
-
-    dimensions = np.array(dimensions)
+    # the plotted columns are just views of the op array
+    dimensions = np.ascontiguousarray(op[:, :min(op.shape[1], 3)].T)
+    x = dimensions[0]
+    y = dimensions[1]
+    if len(dimensions) == 3:
+        z = dimensions[2]
 
     n_clusters = len(set(labels)) - (1 if -1 in labels else 0)
 
@@ -140,30 +142,30 @@ def make_plot(op, labels, centroid_ids, interactive_plot, op_names):
         
         #to make a video showing a rotating plot
         plot_file = "animated.mp4"
-        def init():
-            nonlocal labels, dimensions, n_clusters, centroid_ids, ax
-            a = ax.scatter(x, y, z, s=2, alpha=0.4, c=labels, cmap=plt.get_cmap('tab10', n_clusters+1))
-            cen = ax.scatter(dimensions[0][centroid_ids], dimensions[1][centroid_ids], dimensions[2][centroid_ids], s=1.5, c=[0 for _ in centroid_ids], cmap=ListedColormap(['black']))
-            fig.colorbar(a, ax=ax, ticks=list(set(labels)))
-            handles, _ = cen.legend_elements(prop="colors", num = 1)
-            l = ax.legend(handles, ['Centroids'])
-            return [fig]
+
+        # build the scene once; each animation frame only moves the camera
+        # instead of re-scattering every point
+        a = ax.scatter(x, y, z, s=2, alpha=0.4, c=labels, cmap=plt.get_cmap('tab10', n_clusters+1))
+        cen = ax.scatter(dimensions[0][centroid_ids], dimensions[1][centroid_ids], dimensions[2][centroid_ids], s=1.5, c=[0 for _ in centroid_ids], cmap=ListedColormap(['black']))
+        fig.colorbar(a, ax=ax, ticks=list(set(labels)))
+        handles, _ = cen.legend_elements(prop="colors", num = 1)
+        l = ax.legend(handles, ['Centroids'])
 
         def animate(i):
             ax.view_init(elev=10., azim=i)
-            return [fig]
+            return []
 
         if not interactive_plot:
             try:
-                anim = animation.FuncAnimation(fig, animate, init_func=init, frames=range(360), interval=20, blit=True)
+                # 3D blitting is broken in matplotlib, and with only a camera
+                # move per frame there is nothing to blit anyway
+                anim = animation.FuncAnimation(fig, animate, frames=range(360), interval=20, blit=False)
                 anim.save(plot_file, fps=30, extra_args=['-vcodec', 'libx264'])
                 log("Saved cluster plot to {}".format(plot_file))
             except:
                 print("WARNING: ffmpeg not found, cannot make animated plot, opening interactivley instead")
-                f = init()
                 plt.show()
         else:
-            f = init()
             plt.show()
 
     else:
@@ -211,6 +213,9 @@ def perform_DBSCAN(traj_info:TrajInfo, top_info:TopInfo, op:np.ndarray, metric:s
         np.ndarray: The label for each configuration
     """
     
+    from sklearn.cluster import DBSCAN
+    from sklearn.neighbors import NearestNeighbors
+
     check(["python", "sklearn", "matplotlib"])
     if traj_info.nconfs != len(op):
         raise RuntimeError(f"Length of trajectory ({traj_info.nconfs}) is not equal to length of order parameter array {len(op)}")
@@ -219,12 +224,22 @@ def perform_DBSCAN(traj_info:TrajInfo, top_info:TopInfo, op:np.ndarray, metric:s
     dump_file = "cluster_data.json"
     log("Serializing input data to {}".format(dump_file))
     log("Run  `oat clustering {} -e<eps> -m<min_samples>`  to adjust clustering parameters".format(dump_file))
-    out = {
-        "data": op.tolist(), 
-        "traj" : traj_info.path,
-        "metric" : metric
-    }
-    dump(out, open(dump_file, 'w+'))
+    if ORJSON_AVAILABLE:
+        # orjson formats the array at the C level, no .tolist() copy needed
+        out = {
+            "data": op,
+            "traj" : traj_info.path,
+            "metric" : metric
+        }
+        with open(dump_file, 'wb') as f:
+            f.write(orjson.dumps(out, option=orjson.OPT_SERIALIZE_NUMPY))
+    else:
+        out = {
+            "data": op.tolist(),
+            "traj" : traj_info.path,
+            "metric" : metric
+        }
+        dump(out, open(dump_file, 'w+'))
     
     log("Running DBSCAN...")
 
@@ -236,17 +251,27 @@ def perform_DBSCAN(traj_info:TrajInfo, top_info:TopInfo, op:np.ndarray, metric:s
     #the eps and min_samples need to be determined for each input based on the values of the input data
     #If you're making your own multidimensional data, you probably want to normalize your data first.
     log("Current values: eps={}, min_samples={}".format(eps, min_samples))
-    db = DBSCAN(eps=eps, min_samples=min_samples, metric=metric).fit(op) 
+    if metric == 'euclidean':
+        # DBSCAN on raw points can materialize a dense O(N^2) neighborhood internally.
+        # Precomputing the sparse radius-neighbors graph keeps memory at
+        # O(N * avg_neighbors) and lets DBSCAN skip its own distance computation.
+        # order parameters are low-dimensional, where a kd-tree turns the radius
+        # queries into O(N log N) instead of brute-force O(N^2)
+        algorithm = 'kd_tree' if op.shape[1] <= 20 else 'auto'
+        graph = NearestNeighbors(radius=eps, algorithm=algorithm, leaf_size=40, n_jobs=-1).fit(op).radius_neighbors_graph(op, mode='distance', sort_results=True)
+        db = DBSCAN(eps=eps, min_samples=min_samples, metric='precomputed', n_jobs=-1).fit(graph)
+    else:
+        db = DBSCAN(eps=eps, min_samples=min_samples, metric=metric).fit(op)
     labels = db.labels_
     
-    n_clusters_ = len(set(labels)) - (1 if -1 in labels else 0)
+    # One pass over the labels gets both the clusters and their sizes
+    slabs, counts = np.unique(labels, return_counts=True)
+    n_clusters_ = len(slabs) - (1 if -1 in slabs else 0)
     print ("Number of clusters:", n_clusters_)
 
     #How many are in each cluster?
     print ("cluster\tmembers")
-    slabs = set(labels)
-    for cluster in slabs:
-        in_cluster = list(labels).count(cluster)
+    for cluster, in_cluster in zip(slabs, counts):
         print ("{}\t{}".format(cluster, in_cluster))
 
     # If the hyperparameters don't split the data well, end the run before the long stuff.
@@ -1,6 +1,8 @@
 import os
 import numpy as np
 import argparse
+from multiprocessing import Manager
+from multiprocessing.shared_memory import SharedMemory
 import matplotlib.pyplot as plt
 from oxDNA_analysis_tools.UTILS.logger import log, logger_settings
 from collections import namedtuple
@@ -8,33 +10,135 @@ from oxDNA_analysis_tools.UTILS.RyeReader import describe, get_confs
 from oxDNA_analysis_tools.UTILS.data_structures import TopInfo, TrajInfo
 from oxDNA_analysis_tools.UTILS.oat_multiprocesser import oat_multiprocesser
 from oxDNA_analysis_tools.config import check
-from oxDNA_analysis_tools.distance import vectorized_min_image
+
+# numba is an optional dependency.  If it's available, the pairwise distance
+# accumulation uses a jitted kernel, otherwise we fall back to NumPy.
+try:
+    from numba import njit, prange
+    import numba
+    # the TBB and OpenMP threading layers can deadlock at process exit when the
+    # process has also forked (our multiprocessing pool); workqueue is fork-safe
+    numba.config.THREADING_LAYER = 'workqueue'
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# cupy is also optional.  The accumulation is embarrassingly data-parallel, so
+# if a CUDA device is present the chunks are reduced on the GPU instead.
+try:
+    import cupy as cp
+    CUPY_AVAILABLE = cp.cuda.is_available()
+except Exception:
+    CUPY_AVAILABLE = False
 
 from time import time
 start_time = time()
 
 ComputeContext = namedtuple("ComputeContext",["traj_info",
-                                              "top_info"])
-
-def compute(ctx:ComputeContext, chunk_size:int,  chunk_id:int) -> np.ndarray:
+                                              "top_info",
+                                              "accum_shm_name",
+                                              "lock"])
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, parallel=True, fastmath=True)
+    def _contact_kernel(poses:np.ndarray, box:float, distances:np.ndarray):
+        """
+        Accumulate min-image pairwise distances for a whole chunk into a
+        flattened upper-triangle accumulator (the matrix is symmetric, so only
+        the i<j half is computed).
+
+        Parallelizes over matrix rows rather than confs so no two threads ever
+        write the same element of the accumulator.
+        """
+        nconfs = poses.shape[0]
+        nbases = poses.shape[1]
+        for i in prange(nbases):
+            # start of row i in the flattened upper triangle, offset so that
+            # pair (i,j) lands at base+j
+            base = i*nbases - (i*(i+1))//2 - i - 1
+            for c in range(nconfs):
+                xi = poses[c,i,0]
+                yi = poses[c,i,1]
+                zi = poses[c,i,2]
+                for j in range(i+1, nbases):
+                    dx = xi - poses[c,j,0]
+                    dy = yi - poses[c,j,1]
+                    dz = zi - poses[c,j,2]
+                    dx -= box * np.round(dx / box)
+                    dy -= box * np.round(dy / box)
+                    dz -= box * np.round(dz / box)
+                    distances[base+j] += np.sqrt(dx*dx + dy*dy + dz*dz)
+
+def compute(ctx:ComputeContext, chunk_size:int,  chunk_id:int):
     """
-    Computes the average distance between every pair of nucleotides and creates a matrix of these distances.
+    Computes the distance between every pair of nucleotides in a chunk and adds it to the shared accumulator.
 
     Parameters:
-        ctx (ComputeContext): A named tuple containing trajectory info, topology info, and the number of configurations to process.
+        ctx (ComputeContext): A named tuple containing trajectory info, topology info, the shared accumulator name and its lock.
         chunk_id (int): The id of the chunk to process.
-    
-    Returns:
-        np.ndarray: A NxN matrix containing pairwise distances between every pair of nucleotides.
+
+    Adds the chunk's summed upper-triangle distances into the shared accumulator.
     """
     confs = get_confs(ctx.top_info, ctx.traj_info, chunk_id*chunk_size, chunk_size)
-
-    np_poses = np.asarray([c.positions for c in confs])
-    distances = np.zeros((ctx.top_info.nbases, ctx.top_info.nbases))
-    for c in np_poses:
-        distances += vectorized_min_image(c, c, confs[0].box[0])
-
-    return distances
+    # float32 halves the traffic through the (N,N) accumulator and doubles SIMD
+    # width; single precision is far below the thermal noise in the distances
+    box = np.float32(confs[0].box[0])
+
+    # wrap the whole chunk into the box in one vectorized pass
+    np_poses = np.asarray([c.positions for c in confs], dtype=np.float32)
+    np_poses -= np.floor(np_poses/box) * box
+
+    nbases = ctx.top_info.nbases
+    # the matrix is symmetric, so only the flattened upper triangle is
+    # accumulated; contact_map mirrors it once at the end
+    distances = np.zeros(nbases*(nbases-1)//2, dtype=np.float32)
+
+    on_device = False
+    if CUPY_AVAILABLE:
+        # ship the chunk to the device and accumulate the triangle there; the
+        # per-conf pair buffers are O(nbases^2) device memory and pool workers
+        # share one device, so an allocation failure falls back to the host
+        try:
+            d_pos = cp.asarray(np_poses)
+            iu, ju = cp.triu_indices(nbases, 1)
+            d_acc = cp.zeros(distances.shape, dtype=cp.float32)
+            for c in range(d_pos.shape[0]):
+                diff = d_pos[c, iu] - d_pos[c, ju]
+                diff -= cp.round(diff/box)*box
+                d_acc += cp.sqrt((diff*diff).sum(axis=1))
+            distances += cp.asnumpy(d_acc)
+            on_device = True
+        except cp.cuda.memory.OutOfMemoryError:
+            cp.get_default_memory_pool().free_all_blocks()
+
+    if not on_device:
+        if NUMBA_AVAILABLE:
+            _contact_kernel(np_poses, box, distances)
+        else:
+            # the per-pair min-image math runs in preallocated buffers so the
+            # loop allocates little and accumulates straight into the result
+            iu, ju = np.triu_indices(nbases, 1)
+            diff = np.empty((len(iu), 3), dtype=np.float32)
+            wrapped = np.empty_like(diff)
+            norms = np.empty(len(iu), dtype=np.float32)
+            for c in np_poses:
+                np.subtract(c[iu], c[ju], out=diff)
+                np.divide(diff, box, out=wrapped)
+                np.round(wrapped, out=wrapped)
+                wrapped *= box
+                diff -= wrapped
+                np.einsum('ij,ij->i', diff, diff, out=norms)
+                np.sqrt(norms, out=norms)
+                distances += norms
+
+    # add into the shared accumulator instead of pickling the whole triangle
+    # back to the main process (the cross-chunk sum stays float64)
+    accum_shm = SharedMemory(name=ctx.accum_shm_name)
+    accum = np.ndarray(distances.shape, dtype=np.float64, buffer=accum_shm.buf)
+    with ctx.lock:
+        accum += distances
+    del accum
+    accum_shm.close()
 
 def contact_map(traj_info:TrajInfo, top_info:TopInfo, ncpus=1) -> np.ndarray: 
     """
@@ -48,14 +152,32 @@ def contact_map(traj_info:TrajInfo, top_info:TopInfo, ncpus=1) -> np.ndarray:
         Returns:
             np.ndarray: The average distance between all nucleotides in the structure over the trajectory
     """
-    ctx = ComputeContext(traj_info, top_info)
+    # Workers accumulate into one shared upper triangle instead of each chunk
+    # shipping its own copy back through the pickle boundary
+    n_upper = top_info.nbases*(top_info.nbases-1)//2
+    accum_shm = SharedMemory(create=True, size=n_upper*8)
+    upper = np.ndarray(n_upper, dtype=np.float64, buffer=accum_shm.buf)
+    upper[:] = 0
 
-    distances = np.zeros((top_info.nbases, top_info.nbases))
-    def callback(i, r):
-        nonlocal distances
-        distances += r
+    # a Manager lock survives pickling into the worker processes
+    manager = Manager()
+    ctx = ComputeContext(traj_info, top_info, accum_shm.name, manager.Lock())
 
-    oat_multiprocesser(traj_info.nconfs, ncpus, compute, callback, ctx)
+    def callback(i, r):
+        pass
+
+    try:
+        oat_multiprocesser(traj_info.nconfs, ncpus, compute, callback, ctx)
+
+        # Expand the accumulated upper triangle to the full symmetric matrix
+        distances = np.zeros((top_info.nbases, top_info.nbases))
+        distances[np.triu_indices(top_info.nbases, 1)] = upper
+        distances += distances.T
+    finally:
+        del upper
+        accum_shm.close()
+        accum_shm.unlink()
+        manager.shutdown()
 
     # Normalize the distances and convert to nm
     distances /= traj_info.nconfs
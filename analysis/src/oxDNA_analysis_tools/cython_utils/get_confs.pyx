@@ -1,76 +1,137 @@
 import cython
 import numpy as np
 cimport numpy as numpy
-from cpython.bytes cimport PyBytes_Size 
-from libc.stdio cimport fopen, fclose, fread, fseek, FILE
-from libc.string cimport strtok, strcpy, strlen
-from libc.stdlib cimport atoi, atof, atol, malloc, free
+from libc.string cimport strtok, strlen
+from libc.stdlib cimport atof, atol
 from oxDNA_analysis_tools.UTILS.data_structures import Configuration
 
 """
-Cython function to extract a specified number of configurations from a text trajecory file.
+Cython function to parse configurations out of a chunk of a text trajectory file.
+
+The caller (RyeReader.get_confs) memory-maps the trajectory and hands us a
+writable copy of the relevant byte range, so there is no file I/O here and the
+OS page cache serves repeated reads of the same chunk.
 
 Parameters:
-    idxs (list) : The list of starting bytes for configurations in the trajectory
-    traj_path (str) : The path to the trajectory
-    start (int) : The ID of the first configuration to read in idxs
-    nconfs (int) : How many confs to read?
+    chunk (bytearray) : The raw bytes of the confs.  Must be writable and NUL-terminated; the tokenizer modifies it in-place.
+    conf_starts (list) : The starting byte of each configuration within the chunk
     nbases (int) : How many bases per conf?
-    stride (int) : Return only every this many confs within the chunk.
     incl_vel (bool) : Are velocities included in the trajectory file?
 """
 @cython.wraparound(False)
 @cython.boundscheck(False)
 @cython.cdivision(True)
-def cget_confs(list idxs, str traj_path, int start, int nconfs, int nbases, bint incl_vel=1):
-    # Number of configurations to read
-    cdef int conf_count = len(idxs)
-    cdef int cnconfs = nconfs
-    if (start+cnconfs >= conf_count): #this handles the last chunk which may not have nconfs confs remaining.
-        cnconfs = conf_count - start
-
-    # Configuration start/size markers within the chunk
-    cdef int *sizes = <int *> malloc(cnconfs * sizeof(int))
-    cdef int *conf_starts = <int *> malloc(cnconfs * sizeof(int))
-    if not sizes or not conf_starts:
-        raise MemoryError("Could not allocate memory for the configuration sizes and starts")
-
-    cdef int chunk_size = idxs[start+cnconfs-1].offset + idxs[start+cnconfs-1].size - idxs[start].offset
-    for i in range(cnconfs):
-        sizes[i] = idxs[start+i].size
-        conf_starts[i] = idxs[start+i].offset - idxs[start].offset
-
-    # Convert the path to something C can open
-    cdef char *traj_path_c = <char *>malloc(len(traj_path)+1)
-    strcpy(traj_path_c, traj_path.encode('utf-8'))
-    traj_path_c[len(traj_path)] = b'\0'
-    cdef FILE *traj_file = fopen(traj_path_c, "rb")
-    if traj_file == NULL:
-        raise OSError("Could not open trajectory file %s" % traj_path)
-
-    fseek(traj_file, idxs[start].offset, 1)
-
-    # Read in the current chunk
-    cdef const char *chunk = <char *>malloc(chunk_size)
-    fread(chunk, chunk_size, 1, traj_file)
+def cget_confs(unsigned char[::1] chunk, list conf_starts, int nbases, bint incl_vel=1):
+    cdef int cnconfs = len(conf_starts)
+    cdef char *buf = <char *>&chunk[0]
 
     # Parse the chunk into Configurations
     cdef list confs = [None]*cnconfs
     for i in range(cnconfs):
-        c = parse_conf(chunk, conf_starts[i], nbases, incl_vel)
+        c = parse_conf(buf, conf_starts[i], nbases, incl_vel)
         if c == 1:
-            raise RuntimeError("Trajectory parsing failed on conf {} in chunk {}.  This likely means the previous conf was truncated.".format(i, start))
+            raise RuntimeError("Trajectory parsing failed on conf {}.  This likely means the previous conf was truncated.".format(i))
         else:
             confs[i] = c
 
-    fclose(traj_file)
-    free(chunk)
-    free(traj_path_c)
-    free(sizes)
-    free(conf_starts)
-
     return confs
 
+"""
+Cython function to parse configurations out of a chunk directly into caller-provided
+structure-of-arrays buffers.
+
+This is the allocation-free path: the caller (RyeReader.get_confs_soa) keeps the
+buffers in a per-process pool keyed on shape, so steady-state chunk reads create
+no Configuration objects and no new arrays at all.
+
+Parameters:
+    chunk (bytearray) : The raw bytes of the confs.  Must be writable and NUL-terminated; the tokenizer modifies it in-place.
+    conf_starts (list) : The starting byte of each configuration within the chunk
+    nbases (int) : How many bases per conf?
+    times (np.ndarray[int64]) : (nconfs,) output buffer for the times
+    boxes (np.ndarray[float64]) : (nconfs, 3) output buffer for the boxes
+    energies (np.ndarray[float64]) : (nconfs, 3) output buffer for the energies
+    positions (np.ndarray[float64]) : (nconfs, nbases, 3) output buffer for the positions
+    a1s (np.ndarray[float64]) : (nconfs, nbases, 3) output buffer for the a1 vectors
+    a3s (np.ndarray[float64]) : (nconfs, nbases, 3) output buffer for the a3 vectors
+    incl_vel (bool) : Are velocities included in the trajectory file?
+"""
+@cython.wraparound(False)
+@cython.boundscheck(False)
+@cython.cdivision(True)
+def cget_confs_soa(unsigned char[::1] chunk, list conf_starts, int nbases,
+                   numpy.int64_t[::1] times, double[:, ::1] boxes, double[:, ::1] energies,
+                   double[:, :, ::1] positions, double[:, :, ::1] a1s, double[:, :, ::1] a3s,
+                   bint incl_vel=1):
+    cdef int cnconfs = len(conf_starts)
+    cdef char *buf = <char *>&chunk[0]
+
+    for i in range(cnconfs):
+        if parse_conf_soa(buf, conf_starts[i], nbases, i, times, boxes, energies, positions, a1s, a3s, incl_vel) == 1:
+            raise RuntimeError("Trajectory parsing failed on conf {}.  This likely means the previous conf was truncated.".format(i))
+
+@cython.wraparound(False)
+@cython.boundscheck(False)
+cdef int parse_conf_soa(char *chunk, int start_byte, int nbases, Py_ssize_t n,
+                        numpy.int64_t[::1] times, double[:, ::1] boxes, double[:, ::1] energies,
+                        double[:, :, ::1] positions, double[:, :, ::1] a1s, double[:, :, ::1] a3s,
+                        bint incl_vel=1) except -1:
+    cdef int THREE = 3
+    cdef int j = 0
+    cdef int i = 0
+
+    # Get a pointer to the start of the configuration
+    cdef const char *ptr = chunk + start_byte
+    if strlen(ptr) == 1:
+        return 1
+
+    # Get the time
+    ptr = strtok(ptr, 't =\n')
+    times[n] = atol(ptr)
+
+    # Get the box
+    ptr = strtok(NULL, 'b =')
+    for j in range(THREE):
+        boxes[n, j] = atof(ptr)
+        ptr = strtok(NULL, ' ')
+    ptr = strtok(NULL, '\nE =')
+
+    energies[n, 0] = atof(ptr)
+    ptr = strtok(NULL, ' ')
+    energies[n, 1] = atof(ptr)
+    ptr = strtok(NULL, ' \n')
+    energies[n, 2] = atof(ptr)
+
+    # Parse the configuration itself
+    for i in range(nbases):
+        for j in range(THREE):
+            ptr = strtok(NULL, ' ')
+            if not ptr:
+                raise RuntimeError("Final configuration (t={}) ended earlier than expected.  It is probably truncated.".format(times[n]))
+            positions[n, i, j] = atof(ptr)
+        for j in range(THREE):
+            ptr = strtok(NULL, ' ')
+            if not ptr:
+                raise RuntimeError("Final configuration (t={}) ended earlier than expected.  It is probably truncated.".format(times[n]))
+            a1s[n, i, j] = atof(ptr)
+        if incl_vel:
+            for j in range(THREE):
+                ptr = strtok(NULL, ' ')
+                if not ptr:
+                    raise RuntimeError("Final configuration (t={}) ended earlier than expected.  It is probably truncated.".format(times[n]))
+                a3s[n, i, j] = atof(ptr)
+            ptr = strtok(NULL, '\n')
+        else:
+            for j in range(2):
+                ptr = strtok(NULL, ' ')
+                if not ptr:
+                    raise RuntimeError("Final configuration (t={}) ended earlier than expected.  It is probably truncated.".format(times[n]))
+                a3s[n, i, j] = atof(ptr)
+            ptr = strtok(NULL, '\n')
+            a3s[n, i, 2] = atof(ptr)
+
+    return 0
+
 @cython.wraparound(False)
 @cython.boundscheck(False)
 cdef parse_conf(char *chunk, int start_byte, int nbases, bint incl_vel=1):
@@ -0,0 +1,52 @@
+import cython
+from libc.stdio cimport snprintf
+from libc.stdlib cimport malloc, free
+
+"""
+Cython function to serialize a chunk of configurations to trajectory-file bytes.
+
+ASCII float formatting is the hottest remaining Python-level path when writing
+trajectories; doing it with snprintf into one preallocated buffer removes the
+per-value interpreter dispatch entirely.
+
+Parameters:
+    times (np.ndarray[int64]) : (nconfs,) time step of each conf
+    boxes (np.ndarray[float64]) : (nconfs, 3) box of each conf
+    energies (np.ndarray[float64]) : (nconfs, 3) energies of each conf
+    combined (np.ndarray[float64]) : (nconfs, nbases, ncols) particle lines; 9 columns, or 15 with velocities
+"""
+@cython.wraparound(False)
+@cython.boundscheck(False)
+def cserialize_chunk(long long[::1] times, double[:, ::1] boxes, double[:, ::1] energies, double[:, :, ::1] combined):
+    cdef Py_ssize_t nconfs = combined.shape[0]
+    cdef Py_ssize_t nbases = combined.shape[1]
+    cdef Py_ssize_t ncols = combined.shape[2]
+
+    # worst case is ~24 chars per %.10g value plus a separator, headers are small
+    cdef size_t bufsize = <size_t>nconfs * (<size_t>nbases * ncols * 25 + 256)
+    cdef char *buf = <char *>malloc(bufsize)
+    if not buf:
+        raise MemoryError("Could not allocate serialization buffer")
+
+    cdef size_t pos = 0
+    cdef Py_ssize_t n, i, j
+    with nogil:
+        for n in range(nconfs):
+            pos += snprintf(buf + pos, bufsize - pos,
+                            "t = %lld\nb = %.10g %.10g %.10g\nE = %.10g %.10g %.10g\n",
+                            times[n],
+                            boxes[n, 0], boxes[n, 1], boxes[n, 2],
+                            energies[n, 0], energies[n, 1], energies[n, 2])
+            for i in range(nbases):
+                for j in range(ncols):
+                    pos += snprintf(buf + pos, bufsize - pos, "%.10g", combined[n, i, j])
+                    if j < ncols - 1:
+                        buf[pos] = b' '
+                    else:
+                        buf[pos] = b'\n'
+                    pos += 1
+
+    try:
+        return buf[:pos]
+    finally:
+        free(buf)
@@ -1,8 +1,26 @@
-from setuptools import setup
+from setuptools import setup, Extension
 from Cython.Build import cythonize
+from glob import glob
+import sys
 import numpy as np
 
+# MSVC doesn't understand the gcc/clang flags
+if sys.platform == 'win32':
+    compile_args = ['/O2']
+else:
+    compile_args = ['-O3', '-march=native', '-ffast-math', '-fno-math-errno']
+
+extensions = [
+    Extension(source.split('.')[0], sources=[source], extra_compile_args=compile_args)
+    for source in glob("*.pyx")]
+
 setup(
     include_dirs=[np.get_include()],
-    ext_modules = cythonize("get_confs.pyx", annotate=True, compiler_directives={'language_level' : "3"})
+    ext_modules = cythonize(extensions, annotate=True, compiler_directives={
+        'language_level' : "3",
+        'boundscheck' : False,
+        'wraparound' : False,
+        'cdivision' : True,
+        'initializedcheck' : False
+    })
 )
@@ -3,10 +3,72 @@ import os
 from oxDNA_analysis_tools.UTILS.logger import log, logger_settings
 import argparse
 from typing import List, Dict
+from functools import partial
 import numpy as np
 from oxDNA_analysis_tools.external_force_utils.force_reader import write_force_file
 from oxDNA_analysis_tools.external_force_utils.forces import mutual_trap
 
+# numba is an optional dependency.  If it's available, dot-bracket parsing uses
+# a jitted per-byte kernel, otherwise we fall back to the Python loop.
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _parse_db(buf:np.ndarray):
+        """
+        Jitted dot-bracket parser over ascii bytes with array-backed stacks.
+
+        Returns (output, err_i, err_kind) where err_kind is 0 for success,
+        1 for an invalid character at err_i and 2 for an unmatched bracket.
+        """
+        n = buf.size
+        output = np.full(n, -1, np.int64)
+        paren_stack = np.empty(n, np.int64)
+        square_stack = np.empty(n, np.int64)
+        curly_stack = np.empty(n, np.int64)
+        np_ = ns = nc = 0
+        for i in range(n):
+            c = buf[i]
+            if c == 46: # '.'
+                continue
+            elif c == 40: # '('
+                paren_stack[np_] = i
+                np_ += 1
+            elif c == 91: # '['
+                square_stack[ns] = i
+                ns += 1
+            elif c == 123: # '{'
+                curly_stack[nc] = i
+                nc += 1
+            elif c == 41: # ')'
+                if np_ == 0:
+                    return output, i, 2
+                np_ -= 1
+                pair = paren_stack[np_]
+                output[i] = pair
+                output[pair] = i
+            elif c == 93: # ']'
+                if ns == 0:
+                    return output, i, 2
+                ns -= 1
+                pair = square_stack[ns]
+                output[i] = pair
+                output[pair] = i
+            elif c == 125: # '}'
+                if nc == 0:
+                    return output, i, 2
+                nc -= 1
+                pair = curly_stack[nc]
+                output[i] = pair
+                output[pair] = i
+            else:
+                return output, i, 1
+        return output, -1, 0
+
 def parse_dot_bracket(input:str) -> np.ndarray:
     """
     Converts a dot-bracket string to a list of paired nucleotides.
@@ -19,12 +81,26 @@ def parse_dot_bracket(input:str) -> np.ndarray:
     Returns:
         np.ndarray: A list where each index corresponds to a nucleotide.  Value is -1 is unpaired or another index if paired.
     """
+    input = input.strip()
+
+    if NUMBA_AVAILABLE:
+        try:
+            buf = np.frombuffer(input.encode('ascii'), dtype=np.uint8)
+        except UnicodeEncodeError as e:
+            raise RuntimeError("Encountered invalid character '{}' in dot bracket".format(input[e.start]))
+        output, err_i, err_kind = _parse_db(buf)
+        if err_kind == 1:
+            raise RuntimeError("Encountered invalid character '{}' in dot bracket".format(input[err_i]))
+        if err_kind == 2:
+            raise RuntimeError("Unmatched '{}' at position {} in dot bracket".format(input[err_i], err_i))
+        return output
+
     output = np.full(len(input), -1)
     paren_queue = []
     square_queue = []
     curly_queue = []
 
-    for i, c in enumerate(input.strip()):
+    for i, c in enumerate(input):
         if c == '.':
             continue
         elif c == '(':
@@ -50,6 +126,9 @@ def parse_dot_bracket(input:str) -> np.ndarray:
 
     return output
 
+# reversing a dot-bracket turns every opening bracket into a closing one and vice versa
+_DB_SWAP = str.maketrans('()[]{}', ')(][}{')
+
 def db_to_forcelist(db_str:str, stiff:float, reverse:bool, r0:float=1.2, PBC:bool=True, rate:float=0, stiff_rate:float=0) -> List[Dict]:
     """
         Convert a dot-bracket string to oxDNA mutual traps
@@ -63,26 +142,18 @@ def db_to_forcelist(db_str:str, stiff:float, reverse:bool, r0:float=1.2, PBC:boo
             List[Dict]: A list of force dictionaries
     """
     if reverse:
-        db_str = db_str[::-1]
-        db_str = db_str.replace('(', '&')
-        db_str = db_str.replace(')', '(')
-        db_str = db_str.replace('&', ')')
-        db_str = db_str.replace('[', '&')
-        db_str = db_str.replace(']', '[')
-        db_str = db_str.replace('&', ']')
-        db_str = db_str.replace('{', '&')
-        db_str = db_str.replace('}', '{')
-        db_str = db_str.replace('&', '}')
+        # one C-level pass instead of nine str.replace copies
+        db_str = db_str[::-1].translate(_DB_SWAP)
 
     # convert the db string to an index list
     db_idx = parse_dot_bracket(db_str)
 
-    force_list = []
-
-    #p is particle id, q is paired particle id
-    for p, q in enumerate(db_idx):
-        if q != -1:
-            force_list.append(mutual_trap(p, q, stiff, r0, True, rate=rate, stiff_rate=stiff_rate))
+    #p is particle id, q is paired particle id (filter the unpaired ones in NumPy)
+    p_arr = np.flatnonzero(db_idx != -1)
+    q_arr = db_idx[p_arr]
+    # bind the shared trap parameters once; only the particle ids vary per pair
+    make_trap = partial(mutual_trap, stiff=stiff, r0=r0, PBC=True, rate=rate, stiff_rate=stiff_rate)
+    force_list = [make_trap(int(p), int(q)) for p, q in zip(p_arr, q_arr)]
 
     return force_list
 
@@ -30,11 +30,13 @@ def forces2pairs(force_file:str) -> List[Tuple]:
     pairs = []
     a = b = -1
     with open(force_file, 'r') as f:
-        for line in f.readlines():
+        # iterate the file directly instead of materializing every line up front
+        for line in f:
             line = line.strip()
+            # prefix tests instead of substring scans of every line
             if line.startswith("particle"):
                 a = int(float(line.split("=")[1].strip()))
-            if "ref_particle" in line:
+            elif line.startswith("ref_particle"):
                 b = int(float(line.split("=")[1].strip()))
             if "}" in line:
                 if a < b:
@@ -0,0 +1,33 @@
+import os
+from pathlib import Path
+import pytest
+from oxDNA_analysis_tools.align import align
+
+@pytest.fixture(scope="session")
+def align_input(tmp_path_factory):
+    """
+        Stage the test trajectory and reference aligned outputs once per session.
+
+        Returns a dict with the staged trajectory path and, per center setting,
+        the output of a single-cpu align run that the parametrized variants
+        must reproduce exactly.
+    """
+    dest_dir = tmp_path_factory.mktemp("align")
+    mini_traj = Path(__file__).parent / "minitraj.dat"
+
+    # link rather than copy; the tests only read the trajectory
+    traj = dest_dir / mini_traj.name
+    try:
+        os.link(mini_traj, traj)
+    except OSError:
+        # tmpdir on another filesystem
+        os.symlink(mini_traj.resolve(), traj)
+    data = {"traj": traj}
+
+    data["test"] = {}
+    for center in (True, False):
+        ref = dest_dir / "aligned_ref_{}.dat".format(center)
+        align(str(data["traj"]), str(ref), ncpus=1, center=center)
+        data["test"][center] = ref
+
+    return data
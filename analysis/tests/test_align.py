@@ -0,0 +1,12 @@
+import filecmp
+import pytest
+from oxDNA_analysis_tools.align import align
+
+@pytest.mark.parametrize("ncpus", [1, 2, 4])
+@pytest.mark.parametrize("center", [True, False])
+def test_align(align_input, tmp_path, ncpus, center):
+    # every (ncpus, center) combination must reproduce the single-cpu
+    # reference for that center setting byte-for-byte
+    outfile = tmp_path / "aligned_{}_{}.dat".format(ncpus, center)
+    align(str(align_input["traj"]), str(outfile), ncpus=ncpus, center=center)
+    assert filecmp.cmp(outfile, align_input["test"][center], shallow=False)